@@ -1,11 +1,19 @@
-def check_install():
-    """
-    Verifies that xilinxutils is installed and functional.
-    Returns version and basic environment info.
-    """
-    from importlib.metadata import version
+from functools import cache
+from importlib.metadata import version
+
+
+@cache
+def _install_info():
     return {
         "package": "xilinxutils",
         "version": version("xilinxutils"),
         "status": "OK"
     }
+
+
+def check_install():
+    """
+    Verifies that xilinxutils is installed and functional.
+    Returns version and basic environment info.
+    """
+    return dict(_install_info())
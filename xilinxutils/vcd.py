@@ -1,7 +1,189 @@
+import re
+import warnings
+
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection, PolyCollection
 from vcdvcd import VCDVCD
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None  # numba is optional; the NumPy versions are used instead
+
+try:
+    from tsdownsample import MinMaxDownsampler
+except ImportError:
+    MinMaxDownsampler = None  # tsdownsample is optional; _minmax_indices has a NumPy version
+
+# Bit range at the end of a bus signal name, e.g. 'TDATA[31:0]'
+_WIDTH_RE = re.compile(r'\[(\d+):(\d+)\]$')
+
+
+def _bin_to_uint_loop(
+        buf : np.ndarray,
+        offsets : np.ndarray) -> np.ndarray:
+    """
+    Converts packed ASCII binary strings to unsigned integers.
+
+    Value i is the string buf[offsets[i]:offsets[i+1]].  Only the low bit
+    of each character is used, so 'x' and 'z' characters read as 0.
+    This loop is compiled with numba when it is available.
+    """
+    n = len(offsets) - 1
+    out = np.zeros(n, dtype=np.uint64)
+    for i in range(n):
+        acc = np.uint64(0)
+        for k in range(offsets[i], offsets[i + 1]):
+            acc = (acc << np.uint64(1)) | np.uint64(buf[k] & 1)
+        out[i] = acc
+    return out
+
+
+def _bin_to_uint_np(
+        buf : np.ndarray,
+        offsets : np.ndarray) -> np.ndarray:
+    """
+    NumPy version of _bin_to_uint_loop, used when numba is not installed.
+    """
+    n = len(offsets) - 1
+    lengths = np.diff(offsets)
+
+    # Bit position of each character within its value.  Bits above 63
+    # are dropped, as in the compiled loop.
+    shift = np.repeat(offsets[1:], lengths) - 1 - np.arange(len(buf))
+    bits = (buf & 1).astype(np.uint64)
+    bits[shift >= 64] = 0
+    bits <<= np.minimum(shift, 63).astype(np.uint64)
+
+    out = np.zeros(n, dtype=np.uint64)
+    np.bitwise_or.at(out, np.repeat(np.arange(n), lengths), bits)
+    return out
+
+
+def _axis_bursts_loop(
+        tvalid : np.ndarray,
+        tready : np.ndarray,
+        tlast : np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the AXI4-Stream bursts in clock-sampled handshake signals.
+
+    Returns the cycle indices of the first and last beat of each complete
+    burst, and the type of every cycle: 0 (transfer), 1 (idle, tvalid=0)
+    or 2 (stall, tready=0).  A burst starts at its first transfer and ends
+    at a transfer with tlast.  A trailing burst without tlast is dropped.
+    This loop is compiled with numba when it is available.
+    """
+    n = len(tvalid)
+
+    # Count the bursts to size the outputs
+    nbursts = 0
+    for i in range(n):
+        if tvalid[i] and tready[i] and tlast[i]:
+            nbursts += 1
+
+    starts = np.empty(nbursts, dtype=np.int64)
+    ends = np.empty(nbursts, dtype=np.int64)
+    beat_type = np.empty(n, dtype=np.uint8)
+    k = 0
+    cur_start = -1
+    for i in range(n):
+        if tvalid[i] and tready[i]:
+            beat_type[i] = 0
+            if cur_start < 0:
+                cur_start = i
+            if tlast[i]:
+                starts[k] = cur_start
+                ends[k] = i
+                k += 1
+                cur_start = -1
+        elif not tvalid[i]:
+            beat_type[i] = 1
+        else:
+            beat_type[i] = 2
+    return starts, ends, beat_type
+
+
+def _axis_bursts_np(
+        tvalid : np.ndarray,
+        tready : np.ndarray,
+        tlast : np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    NumPy version of _axis_bursts_loop, used when numba is not installed.
+    """
+    transfer = tvalid & tready
+    beat_type = np.where(transfer, 0, np.where(tvalid ^ 1, 1, 2)).astype(np.uint8)
+
+    # Each burst ends at a transfer with tlast and starts at the first
+    # transfer after the previous burst ended.  Bursts can be back to back,
+    # so the starts are not the rising edges of the transfer mask.
+    ends = np.flatnonzero(transfer & tlast)
+    xfer_idx = np.flatnonzero(transfer)
+    prev_end = np.concatenate(([-1], ends))[:-1]
+    starts = xfer_idx[np.searchsorted(xfer_idx, prev_end, side='right')]
+    return starts, ends, beat_type
+
+
+if njit is not None:
+    _bin_to_uint = njit(cache=True)(_bin_to_uint_loop)
+    _axis_bursts = njit(cache=True)(_axis_bursts_loop)
+else:
+    _bin_to_uint = _bin_to_uint_np
+    _axis_bursts = _axis_bursts_np
+
+
+def _minmax_indices(
+        times : np.ndarray,
+        values : np.ndarray,
+        nbins : int) -> np.ndarray:
+    """
+    MinMax downsampling of a signal for plotting.
+
+    The time range is split into nbins equal bins and the indices of the
+    minimum and maximum value in each bin are kept, so the envelope of the
+    signal is preserved.  Uses tsdownsample when it is installed.
+
+    Returns
+    -------
+    idx : np.ndarray
+        Sorted indices of the samples to keep.  The first and last samples
+        are always kept.
+    """
+    if MinMaxDownsampler is not None and values.dtype != object:
+        idx = MinMaxDownsampler().downsample(times, values, n_out=2*nbins).astype(np.int64)
+    else:
+        t0, t1 = times[0], times[-1]
+        scale = nbins / (t1 - t0) if t1 > t0 else 0
+        bins = np.minimum(((times - t0) * scale).astype(np.int64), nbins - 1)
+
+        # Sort by bin, then by value.  The first and last sample of each bin
+        # in this order are the minimum and maximum.
+        order = np.lexsort((values, bins))
+        new_bin = np.flatnonzero(np.diff(bins[order])) + 1
+        first = np.concatenate(([0], new_bin))
+        last = np.concatenate((new_bin - 1, [len(order) - 1]))
+        idx = order[np.concatenate((first, last))]
+    return np.union1d(idx, [0, len(times) - 1])
+
+
+def _format_property(attr : str) -> property:
+    """
+    Property for a SigInfo format attribute.  Changing the value calls
+    invalidate(), so the next get_values() reformats the signal.
+    """
+    private = '_' + attr
+
+    def fget(self):
+        return getattr(self, private)
+
+    def fset(self, value):
+        if getattr(self, private, None) != value:
+            setattr(self, private, value)
+            self.invalidate()
+
+    return property(fget, fset)
+
+
 class SigInfo(object):
     """
     Class to hold information about a VCD signal.
@@ -19,10 +201,20 @@ class SigInfo(object):
         Type of numeric data ('str', 'int', 'float').
     numeric_fmt_str : str
         Format string for numeric display.  
+        Changing two_level, vcd_fmt or numeric_fmt_str clears the values
+        cached by get_values.
     is_clock : bool
         True if the signal is identified as a clock.
-    values : list of str
-        List of signal values from the VCD file
+    values : tuple of str
+        Signal values from the VCD file.  Built on first access from
+        value_buf and value_off.  The tuple is read-only; assign a new
+        sequence to values to change them.
+    value_buf : np.ndarray
+        The signal values concatenated as UTF-8 bytes (uint8).  VCD values
+        are normally ASCII, so this is one byte per character.
+    value_off : np.ndarray
+        Byte offsets into value_buf, so that value i is
+        value_buf[value_off[i]:value_off[i+1]].
     times : list of int
         List of time points corresponding to the signal values.
     disp_vals : list of str
@@ -30,6 +222,14 @@ class SigInfo(object):
     short_name : str
         Short name of the signal (e.g., last part of full name).
     """
+    two_level = _format_property('two_level')
+    vcd_fmt = _format_property('vcd_fmt')
+    numeric_fmt_str = _format_property('numeric_fmt_str')
+
+    # Count of short_name assignments over all signals, so VcdViewer can
+    # tell when its short name lookup is out of date
+    _short_name_changes = 0
+
     def __init__(
             self,
             name : str,
@@ -44,18 +244,61 @@ class SigInfo(object):
         self.time_scale = time_scale
 
         # Get time and value lists
-        n  = len(tv)
-        self.times = np.zeros(n, dtype=float)
-        self.values = []
-        for i, (t, v) in enumerate(tv):
-            self.values.append(v)
-            self.times[i] = t / self.time_scale  # Scale time
+        if len(tv) > 0:
+            ts, vs = zip(*tv)
+            self.times = np.asarray(ts, dtype=np.float64)
+            self.times /= self.time_scale  # Scale time
+        else:
+            self.times = np.zeros(0, dtype=np.float64)
+            vs = []
+        self.values = vs
         self.short_name = name.split('.')[-1]
         self.disp_values = None
         self.numeric_values = None
 
         self.set_format()
 
+    @property
+    def short_name(self) -> str:
+        """
+        Short name of the signal.
+        """
+        return self._short_name
+
+    @short_name.setter
+    def short_name(self, short_name : str):
+        self._short_name = short_name
+        SigInfo._short_name_changes += 1
+
+    @property
+    def values(self) -> tuple[str, ...]:
+        """
+        Signal values as strings.
+        """
+        if self._values is None:
+            data = self.value_buf.tobytes()
+            off = self.value_off.tolist()
+            self._values = tuple(data[i:j].decode('utf-8') for i, j in zip(off[:-1], off[1:]))
+        return self._values
+
+    @values.setter
+    def values(self, vs : list[str]):
+        # Store the values as one UTF-8 buffer with byte offsets
+        encoded = [v.encode('utf-8') for v in vs]
+        self.value_buf = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        self.value_off = np.zeros(len(vs) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in encoded], out=self.value_off[1:])
+        self._values = None
+        self.invalidate()
+
+    def _unspecified(self) -> np.ndarray:
+        """
+        Returns a boolean mask of the values that are 'x' or 'z'.
+        """
+        lengths = np.diff(self.value_off)
+        first = np.append(self.value_buf, np.uint8(0))[self.value_off[:-1]]
+        return (lengths == 1) & np.isin(first, np.frombuffer(b'xXzZ', dtype=np.uint8))
+
     def set_format(self):
         """
         Auto-detects the format of the signal based on its values.
@@ -65,18 +308,24 @@ class SigInfo(object):
         The format can be over-written later if needed.
         """
     
-        # Remove un-specified values
-        filtered = [v for v in self.values if v not in {'x', 'X', 'z', 'Z'}]
+        # Count the characters other than '0' and '1' in each value
+        # and remove un-specified values
+        buf, off = self.value_buf, self.value_off
+        not01 = np.zeros(len(buf) + 1, dtype=np.int64)
+        np.cumsum((buf != ord('0')) & (buf != ord('1')), out=not01[1:])
+        specified = ~self._unspecified()
+        n_not01 = (not01[off[1:]] - not01[off[:-1]])[specified]
+        lengths = np.diff(off)[specified]
 
         # Check if all values are single-bit '0' or '1'
-        if all(v in {'0', '1'} for v in filtered):
+        if np.all((lengths == 1) & (n_not01 == 0)):
             self.two_level = True
             self.numeric_type  = 'int'
             self.numeric_fmt_str = '%d'
             self.vcd_fmt = 'binary'
 
         # Check if all values are strings composed only of '0' and '1's
-        elif all(set(v).issubset({'0', '1'}) for v in filtered):
+        elif np.all(n_not01 == 0):
             self.vcd_fmt = 'binary'
             self.numeric_type  = 'int'
 
@@ -86,24 +335,60 @@ class SigInfo(object):
             if 'clock' in name_lower or 'clk' in name_lower:
                 self.is_clock = True
 
+    def invalidate(self):
+        """
+        Clears the converted values, so the next call to get_values
+        recomputes them.  This is called automatically when the values
+        or the format attributes are changed.
+        """
+        self.disp_values = None
+        self.numeric_values = None
+
     def get_values(self):
         """
         Converts the signal numeric and display values based on the format.   
 
+        The result is cached until `invalidate` is called.
         Right now, `float` is not implemented.
         """
-        self.disp_values = []
-        self.numeric_values = []
-        for v in self.values:
-            d = str(v)  # Default is to  display original value
-            num_value = 0
-            if not (v in {'x', 'X', 'z', 'Z'}):
-                if self.vcd_fmt == 'binary':
-                    num_value = int(v, 2)
-                    d = self.numeric_fmt_str % num_value                    
-            self.numeric_values.append(num_value)
-            self.disp_values.append(d)
-        self.numeric_values = np.array(self.numeric_values).astype(np.uint32)
+        if self.disp_values is not None and self.numeric_values is not None:
+            return
+
+        n = len(self.value_off) - 1
+        if self.vcd_fmt != 'binary':
+            # Display the original values
+            self.numeric_values = np.zeros(n, dtype=np.uint8)
+            self.disp_values = list(self.values)
+            return
+
+        # Use the smallest unsigned type that holds the widest value
+        specified = ~self._unspecified()
+        bitwidth = int(np.diff(self.value_off).max(initial=1))
+        if bitwidth > 64:
+            warnings.warn(
+                f"Signal '{self.name}' is {bitwidth} bits wide; "
+                "numeric values are stored as Python ints.")
+            numeric_values = np.array(
+                [int(v, 2) if spec else 0 for v, spec in zip(self.values, specified.tolist())],
+                dtype=object)
+        else:
+            # Convert all the values at once from the ASCII buffer.
+            # Un-specified values ('x', 'z') convert to 0.
+            numeric_values = _bin_to_uint(self.value_buf, self.value_off)
+            for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+                if bitwidth <= np.iinfo(dtype).bits:
+                    numeric_values = numeric_values.astype(dtype)
+                    break
+        self.numeric_values = numeric_values
+
+        # Display the formatted value, or the original string if unspecified.
+        # Signals typically take few distinct values, so only the unique
+        # values are formatted and then gathered back.
+        uniq, inv = np.unique(numeric_values[specified], return_inverse=True)
+        disp_uniq = np.array([self.numeric_fmt_str % u for u in uniq.tolist()], dtype=object)
+        disp_values = np.array(self.values, dtype=object)
+        disp_values[specified] = disp_uniq[inv]
+        self.disp_values = disp_values.tolist()
 
     
 
@@ -133,25 +418,35 @@ class VcdViewer(object):
         self.sig_info = dict()
         self.time_scale = 1e3  # default to ns
 
+        # Signal names for the lookups in the add_* methods
+        self._signals = list(self.vcd.signals)
+        self._signals_set = set(self._signals)
+        self._signals_lower = [s.lower() for s in self._signals]
+
+        # Signals containing each AXI4-Stream keyword, built on first use
+        self._axiss_index = None
+
+        # Map from short name to full name, rebuilt by full_name when a
+        # short name or sig_info changes
+        self._short_to_full = dict()
+        self._short_to_full_key = None
+
   
     def add_signal(self, 
                    name : str):
         """ 
         Adds a signal to be processed
         """
-        for s in self.vcd.signals:
-            if s == name:
-                sig_info = SigInfo(name, self.vcd[s].tv, self.time_scale)
-                self.sig_info[s] = sig_info                
-                return
-        raise ValueError(f"Signal '{name}' not found in VCD.")
+        if name not in self._signals_set:
+            raise ValueError(f"Signal '{name}' not found in VCD.")
+        self.sig_info[name] = SigInfo(name, self.vcd[name].tv, self.time_scale)
 
     def add_saxi_signals(self):
         """ 
         Adds the s_axi_control signals to disp_signals. 
         """
         prefix = 's_axi_control'
-        for s in self.vcd.signals:
+        for s in self._signals:
             if prefix in s:
                 short_name = s.split(f"{prefix}_")[-1]
                 self.add_signal(s)
@@ -172,8 +467,7 @@ class VcdViewer(object):
         full_name : str
             Full name of the clock signal added.
         """
-        for s in self.vcd.signals:
-            name_lower = s.lower()
+        for s, name_lower in zip(self._signals, self._signals_lower):
             if (('clock' in name_lower) or ('clk' in name_lower)) and (name is None or name in s):
                 name = s
                 break
@@ -201,11 +495,12 @@ class VcdViewer(object):
             Prefix for the status signals
         """
         suffixes = ['clock', 'start', 'done', 'idle', 'ready']
-        for s in self.vcd.signals:
-            for suf in suffixes:
-                if s.endswith(f"{prefix}{suf}"):
-                    self.add_signal(s)
-                    self.sig_info[s].short_name = suf
+        suffix_re = re.compile(re.escape(prefix) + '(' + '|'.join(suffixes) + ')$')
+        for s in self._signals:
+            m = suffix_re.search(s)
+            if m:
+                self.add_signal(s)
+                self.sig_info[s].short_name = m[1]
 
     def add_axiss_signals(
             self,
@@ -229,11 +524,20 @@ class VcdViewer(object):
             Bitwidth of the TDATA signal.
         """
         axi4s_keywords = ['tdata', 'tvalid', 'tready', 'tlast']
+
+        # Index the signals by keyword in one pass over the names
+        if self._axiss_index is None:
+            self._axiss_index = {kw: [] for kw in axi4s_keywords}
+            for s, s_lower in zip(self._signals, self._signals_lower):
+                for kw in axi4s_keywords:
+                    if kw in s_lower:
+                        self._axiss_index[kw].append(s)
+
         axi_sigs = dict()
         for kw in axi4s_keywords:
             axi_sigs[kw] = None
-            for s in self.vcd.signals:
-                if kw in s.lower() and (name is None or name in s):
+            for s in self._axiss_index[kw]:
+                if name is None or name in s:
                     if axi_sigs[kw] is not None:
                         raise ValueError(f"Multiple signals found for AXI4-Stream keyword '{kw}'.")
                     axi_sigs[kw] = s
@@ -249,19 +553,13 @@ class VcdViewer(object):
                 raise ValueError(f"No signal found for AXI4-Stream keyword '{kw}'.")
             
         # Get the bitwidth from the TDATA signal.
-        # The signal ends in [N:0], so the width is N+1
+        # The signal ends in [msb:lsb], in either bit order
         tdata_sig = axi_sigs['tdata']
-        tdata_parts = tdata_sig.split('[')
-        bitwidth = None
-        if len(tdata_parts) > 1:
-            bit_range = tdata_parts[-1].strip(']')
-            msb_lsb = bit_range.split(':')
-            if len(msb_lsb) == 2:
-                msb = int(msb_lsb[0])
-                bitwidth = msb + 1       
-
-        if bitwidth is None:
+        m = _WIDTH_RE.search(tdata_sig)
+        if m is None:
             raise ValueError(f"Could not determine bitwidth from TDATA signal '{tdata_sig}'.")   
+        msb, lsb = int(m[1]), int(m[2])
+        bitwidth = abs(msb - lsb) + 1
                   
         return axi_sigs, bitwidth
 
@@ -280,10 +578,14 @@ class VcdViewer(object):
         full_name : str
             Full signal name if found, else None
         """
-        for s, si in self.sig_info.items():
-            if si.short_name == short_name:
-                return s
-        return None
+        key = (SigInfo._short_name_changes, tuple(self.sig_info.items()))
+        if key != self._short_to_full_key:
+            # The first signal with a given short name is returned
+            self._short_to_full = dict()
+            for s, si in self.sig_info.items():
+                self._short_to_full.setdefault(si.short_name, s)
+            self._short_to_full_key = key
+        return self._short_to_full.get(short_name)
     
     def get_values(
             self):
@@ -390,19 +692,54 @@ class VcdViewer(object):
         if right_border is None:
             right_border = 0.05 * time_range
 
+        # Set the limits before drawing, so the space check for the
+        # text labels below uses the final data-to-pixel transform
+        ax.set_xlim(tmin - left_border, tmax + right_border)
+        ax.set_ylim(0, ymax)
+
         # Save the top and bottom y positions for each signal
         self.ytop = dict()
         self.ybot = dict()
 
+        # Line segments and unknown-value regions for all signals, drawn
+        # as one collection each at the end
+        segs = []
+        gray_rects = []
+
+        # Signals with many more value changes than pixels are downsampled
+        ax_px = ax.bbox.width
+
+        # Pixels per time unit, for the text space check
+        px_per_t = ax.transData.transform((1, 0))[0] - ax.transData.transform((0, 0))[0]
+
         for i, s in enumerate(signals_to_plot):
             y =  ymax - (i + 0.5) * row_step  # vertical position for signal s
             si = self.sig_info[s]
-            t_list = si.times 
             sn = si.short_name
 
             # Get the display values
             si.get_values()
-            v_list = si.disp_values
+
+            # Keep only the segments that overlap the time range
+            j0 = max(np.searchsorted(si.times, tmin, side='left') - 1, 0)
+            j1 = np.searchsorted(si.times, tmax, side='right')
+            idx = np.arange(j0, j1)
+
+            # Two-level signals are drawn edge by edge.  Other binary signals
+            # are MinMax downsampled when they change much faster than the
+            # pixels.  Only the specified values are downsampled, and every
+            # x/z run is kept, like the edges of a two-level signal.
+            if si.vcd_fmt == 'binary' and not si.two_level and len(idx) > 4 * ax_px:
+                unknown = si._unspecified()[idx]
+                spec = np.flatnonzero(~unknown)
+                keep = np.flatnonzero(np.diff(unknown)) + 1
+                if len(spec) > 0:
+                    keep = np.union1d(keep, spec[_minmax_indices(
+                        si.times[idx[spec]], si.numeric_values[idx[spec]], int(2 * ax_px))])
+                keep = np.union1d(keep, [0, len(idx) - 1])
+                idx = idx[keep]
+            t_list = si.times[idx]
+            v_list = [si.disp_values[k] for k in idx.tolist()]
             
             # Draw signal name
             ax.text(tmin - 0.5, y, sn, ha='right', va='center', fontsize=10)
@@ -453,49 +790,45 @@ class VcdViewer(object):
     
                 # Draw a vertical line at the start of the segment                
                 if draw_vert:
-                    ax.vlines(t_start, ybot, ytop, color='black', linewidth=1)
+                    segs.append([(t_start, ybot), (t_start, ytop)])
                 if draw_bot:
-                    ax.hlines(ybot, t_start, t_end, color='black', linewidth=1)
+                    segs.append([(t_start, ybot), (t_end, ybot)])
                 if draw_top:
-                    ax.hlines(ytop, t_start, t_end, color='black', linewidth=1)
+                    segs.append([(t_start, ytop), (t_end, ytop)])
 
                 # Fill gray for unknown values
                 if fill_gray:
-                    ax.fill_betweenx([ybot, ytop], t_start, t_end, color='lightgray')
+                    gray_rects.append([(t_start, ybot), (t_start, ytop), (t_end, ytop), (t_end, ybot)])
 
                 # Place text label in the middle of the segment
                 # Check if there is enough space to draw the text
                 if text_scale_factor <= 0:
                     draw_text = False
                 if draw_text:
-                    idx_start = ax.transData.transform((t_start, y))
-                    idx_end = ax.transData.transform((t_end, y))
-
-                    if idx_end[0] - idx_start[0] < len(v)*text_scale_factor:
+                    if (t_end - t_start) * px_per_t < len(v)*text_scale_factor:
                         draw_text = False
                 if draw_text:
                     ax.text((t_start + t_end) / 2, y, v, ha='center', va='center',
                             fontsize=10, color='black')
 
+        ax.add_collection(PolyCollection(gray_rects, color='lightgray'))
+        ax.add_collection(LineCollection(segs, colors='black', linewidths=1))
 
         # Add clock grid lines if requested
         if add_clk_grid:
-            clk_signal = None
-            for s, si in self.sig_info.items():
+            clk_si = None
+            for si in self.sig_info.values():
                 if si.is_clock:
-                    clk_signal = si.name
+                    clk_si = si
                     break
-            if not clk_signal:
+            if clk_si is None:
                 raise ValueError("No clock signal found in disp_signals for grid lines.")
 
-            for i, t in enumerate(si.times):
-                v = si.values[i]
-                if v == '1':
-                    ax.axvline(x=t, color='gray', linestyle='--', linewidth=0.5)
+            # Draw all the grid lines as a single collection
+            clk_times = extract_clock_times(clk_si)
+            ax.vlines(clk_times, 0, ymax, colors='gray', linestyles='--', linewidths=0.5)
 
         ax.set_yticks([])
-        ax.set_xlim(tmin - left_border, tmax + right_border)
-        ax.set_ylim(0, ymax)
 
 
         return ax
@@ -529,9 +862,6 @@ class VcdViewer(object):
             Estimated clock period in ns.
             Hence the time for beat i is tstart + i * clk_period
         """
-        bursts = []
-        current_burst = None
-
         # Extract clock times and resample AXI-Stream signals
         clk_sig = self.sig_info[clk_name]
         clk_times = extract_clock_times(clk_sig)
@@ -540,35 +870,27 @@ class VcdViewer(object):
         tready = resample_signal(self.sig_info[axis_sigs['tready']], clk_times)
         tlast = resample_signal(self.sig_info[axis_sigs['tlast']]  , clk_times)
 
-        for i in range(len(tdata)):
-            # Handshake occurs only when both valid and ready are high
-            if tvalid[i] and tready[i]:
-                if current_burst is None:
-                    # Start a new burst
-                    current_burst = {
-                        'data': [],
-                        'start_idx': i,
-                        'beat_type': [],
-                        'tstart': clk_times[i]
-
-                    }
-                # Append this beat
-                current_burst['data'].append(tdata[i])
-                current_burst['beat_type'].append(0)  # transfer
-
-                if tlast[i]:
-                    # End of burst
-                    current_burst['data'] = np.array(current_burst['data']).astype(np.uint32)
-                    bursts.append(current_burst)
-                    current_burst = None
-            else:
-                if current_burst is not None:
-                    if not tvalid[i]:
-                        current_burst['beat_type'].append(1)  # idle
-                    elif not tready[i]:
-                        current_burst['beat_type'].append(2)  # stall
-                # Stall or idle → skip
-                continue
+        # Burst data is at least 32 bits, the word size of VitisStruct.read_stream
+        tdata = tdata.astype(np.promote_types(tdata.dtype, np.uint32))
+
+        # Find the bursts and the type of each beat
+        starts, ends, beat_type = _axis_bursts(
+            tvalid.astype(np.uint8), tready.astype(np.uint8), tlast.astype(np.uint8))
+
+        # Gather the transferred data once and split it after the last beat
+        # of each burst.  The piece after the last burst is an incomplete
+        # burst and is dropped by the zip below.
+        transfer = beat_type == 0
+        burst_data = np.split(tdata[transfer], np.cumsum(transfer)[ends])
+
+        bursts = []
+        for start, end, data in zip(starts.tolist(), ends.tolist(), burst_data):
+            bursts.append({
+                'data': data,
+                'start_idx': start,
+                'beat_type': beat_type[start:end+1].tolist(),
+                'tstart': clk_times[start]
+            })
 
         # Estimate clock period
         clk_diffs = np.diff(clk_times)
@@ -578,31 +900,23 @@ class VcdViewer(object):
 
 
 def extract_clock_times(
-        sig_info : SigInfo) -> list[float]:
+        sig_info : SigInfo) -> np.ndarray:
     """
-    Extracts the clock edge times from a VCD object for a given clock signal.
+    Extracts the clock edge times for a given clock signal.
 
     Parameters
     ----------
-    vcd : VCDVCD
-        Parsed VCD object.
-    clk_name : str
-        Name of the clock signal.
+    sig_info : SigInfo
+        Signal information object for the clock.
 
     Returns
     -------
-    clk_times : list of float
-        List of times (in ns) when the clock signal transitions to '1'.
+    clk_times : np.ndarray
+        Times (in ns) when the clock signal transitions to '1'.
     """
-    
-    clk_times = []
-    for t, v in zip(sig_info.times, sig_info.values):
-        if v == '1':
-            clk_times.append(t)  # Convert to ns
-
-    clk_times = np.array(clk_times)
-
-    return clk_times
+    if sig_info.numeric_values is None:
+        sig_info.get_values()
+    return sig_info.times[sig_info.numeric_values.astype(bool)]
 
 def resample_signal(
         sig_info : SigInfo,
@@ -622,19 +936,11 @@ def resample_signal(
     resampled_values : np.ndarray
         Array of signal values at the new time points.
     """    
-    sig_times = sig_info.times
     sig_values = sig_info.numeric_values
-    sampled = np.empty_like(clk_times, dtype=sig_values.dtype)
-
-    j = 0  # pointer into sig_times and sig_values
-    current_val = sig_values[0]
-
-    for i, t_clk in enumerate(clk_times):
-        # advance signal pointer while events are before or at this clock
-        while j < len(sig_times) and sig_times[j] <= t_clk:
-            current_val = sig_values[j]
-            j += 1
-        sampled[i] = current_val
 
-    return sampled
+    # Index of the last event at or before each clock time.  Times before
+    # the first event take the first value.
+    idx = np.searchsorted(sig_info.times, clk_times, side='right') - 1
+    np.clip(idx, 0, len(sig_values) - 1, out=idx)
+    return sig_values[idx]
 
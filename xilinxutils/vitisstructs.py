@@ -1,9 +1,116 @@
 # xilinxutils/vitisstructs.py:  Data structure code generation for Vitis HLS
 
+import io
+import os
+from functools import lru_cache
 import numpy as np
 import fixedpoint
 from enum import Enum
-from typing import Type
+from typing import Type, TextIO
+
+
+# Templates for the generated stream methods, rendered with str.format_map.
+# The templates only substitute pre-computed strings; the word packing is
+# done in Python by VitisCodeGen._compute_layout().
+STREAM_READ_TMPL = """\
+    template<typename Tstream>
+    bool stream_read_{bus_width}(hls::stream<Tstream>& in) {{
+        constexpr int bus_bits = decltype(Tstream::data)::width;
+        static_assert(bus_bits == {bus_width}, "Only {bus_width}-bit stream supported in {struct_name}::stream_read_{bus_width}");
+
+        // Read all the words in one pipelined loop, then unpack the fields
+        Tstream _words[{total_words}];
+#pragma HLS ARRAY_PARTITION variable=_words type=complete
+        read_loop: for (int _i = 0; _i < {total_words}; _i++) {{
+#pragma HLS PIPELINE II=1
+            _words[_i] = in.read();
+        }}
+
+{field_stmts}\
+        bool tlast = _words[{last_word}].last;
+
+        return tlast;
+    }}"""
+
+STREAM_WRITE_TMPL = """\
+    template<typename Tstream>
+    void stream_write_{bus_width}(hls::stream<Tstream>& out, bool tlast = true) const {{
+        constexpr int bus_bits = decltype(Tstream::data)::width;
+        static_assert(bus_bits == {bus_width}, "Only {bus_width}-bit stream supported in {struct_name}::stream_write_{bus_width}");
+
+{word_blocks}\
+    }}"""
+
+# One word of stream_write.  Words other than the last are followed by a
+# blank line.
+STREAM_WRITE_WORD_TMPL = """\
+        Tstream {var};
+        {var}.data = 0;
+        {var}.keep = -1;
+        {var}.strb = -1;
+{write_stmts}\
+        {var}.last = {last};
+        out.write({var});
+"""
+
+# Templates for the generic stream dispatch methods, rendered with
+# str.format_map.  The _stream_rw<W, Self> selector is resolved at compile
+# time: the primary template fails, and each supported bus width has a
+# partial specialization (DISPATCH_SPEC_TMPL) forwarding to the
+# stream_read_<W> / stream_write_<W> methods.
+DISPATCH_SPEC_TMPL = """
+    template<class Self>
+    struct _stream_rw<{width}, Self> {{
+        template<typename Tstream>
+        static bool read(Self& s, hls::stream<Tstream>& in) {{
+            return s.stream_read_{width}(in);
+        }}
+        template<typename Tstream>
+        static void write(const Self& s, hls::stream<Tstream>& out, bool tlast) {{
+            s.stream_write_{width}(out, tlast);
+        }}
+    }};
+"""
+
+DISPATCH_WRITE_TMPL = """\
+    template<int W, class Self>
+    struct _stream_rw {{
+        static_assert(sizeof(Self) == 0, 
+                      "Unsupported bus width. Supported widths: {widths_str}");
+    }};
+{specializations}
+    template<typename Tstream>
+    void stream_write(hls::stream<Tstream>& out, bool tlast = true) const {{
+        _stream_rw<decltype(Tstream::data)::width, {name}>::write(*this, out, tlast);
+    }}"""
+
+DISPATCH_READ_TMPL = """\
+    template<typename Tstream>
+    bool stream_read(hls::stream<Tstream>& in) {{
+        return _stream_rw<decltype(Tstream::data)::width, {name}>::read(*this, in);
+    }}"""
+
+DISPATCH_NONE_WRITE_TMPL = """\
+    template<typename Tstream>
+    void stream_write(hls::stream<Tstream>& out, bool tlast = true) const {{
+        static_assert(sizeof(Tstream) == 0, 
+                     "No stream bus widths configured for {name}");
+    }}"""
+
+DISPATCH_NONE_READ_TMPL = """\
+    template<typename Tstream>
+    bool stream_read(hls::stream<Tstream>& in) {{
+        static_assert(sizeof(Tstream) == 0, 
+                     "No stream bus widths configured for {name}");
+        return false;
+    }}"""
+
+@lru_cache(maxsize=4096)
+def _range(word_name: str, high: int, low: int) -> str:
+    """
+    Returns the C++ expression for the bit slice word_name[high:low].
+    """
+    return f"{word_name}.range({high}, {low})"
 
 
 class BaseType:
@@ -15,10 +122,16 @@ class BaseType:
     width : int
         Bitwidth of the type.
     """
+    __slots__ = ('width', '_cpp_repr', '_preamble')
+
     def __init__(
             self, 
             width: int):
         self.width = width
+
+        # Generated C++ strings, populated on first use
+        self._cpp_repr = None
+        self._preamble = None
    
     def cpp_repr(self) -> str:
         raise NotImplementedError
@@ -112,8 +225,51 @@ class BaseType:
         """
         raise NotImplementedError
 
-    
-class IntType(BaseType):
+
+class _BitSliceMixin:
+    """
+    Read and write expressions for types that are stored as a plain bit
+    slice of the word (IntType, EnumType).
+    """
+    __slots__ = ()
+
+    def read_expr_impl(self,
+                       word_name: str,
+                       word_width: int,
+                       ind0: int) -> str:
+        """
+        Generate C++ expression to read this type from a word.
+
+        Returns
+        -------
+        str
+            C++ code snippet (expression only).
+        """
+        if self.width == word_width and ind0 == 0:
+            # Direct assignment if the field fills the whole word
+            return word_name
+        return _range(word_name, ind0 + self.width - 1, ind0)
+
+    def write_expr_impl(self,
+                        var_name: str,
+                        word_name: str,
+                        word_width: int,
+                        ind0: int) -> str:
+        """
+        Generate C++ expression to write this type into a word.
+
+        Returns
+        -------
+        str
+            C++ code snippet (statement).
+        """
+        if self.width == word_width and ind0 == 0:
+            # Direct assignment if the field fills the whole word
+            return f"{word_name} = {var_name};"
+        return f"{_range(word_name, ind0 + self.width - 1, ind0)} = {var_name};"
+
+
+class IntType(_BitSliceMixin, BaseType):
     """
     This class is realized as arbitrary precision integer 
     type (ap_int/ap_uint) in Vitis and either np.int32/np.uint32
@@ -129,6 +285,7 @@ class IntType(BaseType):
         Use nunmpy integer types for widths <= 32 (default True).
         Otherwise, use fixedpoint.FixedPoint for all widths.
     """
+    __slots__ = ('signed', 'use_np')
 
     def __init__(
             self, 
@@ -150,50 +307,11 @@ class IntType(BaseType):
         str
             C++ type string for this integer.
         """
-        base = "ap_int" if self.signed else "ap_uint"
-        return f"{base}<{self.width}>"
-
-    def read_expr_impl(self,
-                       word_name: str,
-                       word_width: int,
-                       ind0: int) -> str:
-        """
-        Generate C++ expression to read this integer from a word.
+        if self._cpp_repr is None:
+            base = "ap_int" if self.signed else "ap_uint"
+            self._cpp_repr = f"{base}<{self.width}>"
+        return self._cpp_repr
 
-        Returns
-        -------
-        str
-            C++ code snippet (expression only).
-        """
-        if self.width == word_width and ind0 == 0:
-            # Direct assignment if the field fills the whole word
-            return f"{word_name}"
-        else:
-            # Slice assignment
-            high = ind0 + self.width - 1
-            return f"{word_name}.range({high}, {ind0})"
-
-    def write_expr_impl(self,
-                        var_name: str,
-                        word_name: str,
-                        word_width: int,
-                        ind0: int) -> str:
-        """
-        Generate C++ expression to write this integer into a word.
-
-        Returns
-        -------
-        str
-            C++ code snippet (statement).
-        """
-        if self.width == word_width and ind0 == 0:
-            # Direct assignment if the field fills the whole word
-            return f"{word_name} = {var_name};"
-        else:
-            # Slice assignment
-            high = ind0 + self.width - 1
-            return f"{word_name}.range({high}, {ind0}) = {var_name};"
-        
     def init_python_value(self):
         """
         Returns an initial value for a python field of this type.
@@ -249,9 +367,11 @@ class FloatType(BaseType):
     Notes
     -----
     - Always uses 32 bits.
-    - Conversion between ap_uint<32> and float is done via a union
-      to preserve bit patterns safely in HLS.
+    - Conversion between ap_uint<32> and float is done with the
+      _bits_to_float / _float_to_bits helpers declared in the preamble,
+      which use a union to preserve bit patterns safely in HLS.
     """
+    __slots__ = ()
 
     def __init__(self):
         super().__init__(32)
@@ -270,12 +390,12 @@ class FloatType(BaseType):
                        word_width: int,
                        ind0: int) -> str:
         """
-        Generate C++ code to read a float from a word.
+        Generate C++ expression to read a float from a word.
 
         Returns
         -------
         str
-            C++ code snippet (statement).
+            C++ code snippet (expression only).
         """
         if ind0 + self.width > word_width:
             raise ValueError("Float field does not fit in word")
@@ -285,13 +405,9 @@ class FloatType(BaseType):
             src_expr = word_name
         else:
             high = ind0 + self.width - 1
-            src_expr = f"{word_name}.range({high}, {ind0})"
+            src_expr = _range(word_name, high, ind0)
 
-        return (
-            "union { float f; ap_uint<32> u; } conv;\n"
-            f"        conv.u = {src_expr};\n"
-            f"        /* assign to variable */ conv.f"
-        )
+        return f"_bits_to_float({src_expr})"
 
     def write_expr_impl(self,
                         var_name: str,
@@ -309,12 +425,38 @@ class FloatType(BaseType):
         if ind0 + self.width > word_width:
             raise ValueError("Float field does not fit in word")
 
-        high = ind0 + self.width - 1
-        return (
-            "union { float f; ap_uint<32> u; } conv;\n"
-            f"        conv.f = {var_name};\n"
-            f"        {word_name}.range({high}, {ind0}) = conv.u;"
-        )
+        if self.width == word_width and ind0 == 0:
+            dst_expr = word_name
+        else:
+            high = ind0 + self.width - 1
+            dst_expr = _range(word_name, high, ind0)
+
+        return f"{dst_expr} = _float_to_bits({var_name});"
+
+    def preamble(self) -> str:
+        """
+        Generate the C++ helpers converting between float and its bits.
+
+        Returns
+        -------
+        str
+            C++ code snippet with the _bits_to_float and _float_to_bits
+            static methods.
+        """
+        if self._preamble is None:
+            self._preamble = (
+                "static float _bits_to_float(ap_uint<32> u) {\n"
+                "        union { float f; unsigned int u; } conv;\n"
+                "        conv.u = u.to_uint();\n"
+                "        return conv.f;\n"
+                "    }\n"
+                "\n"
+                "    static ap_uint<32> _float_to_bits(float f) {\n"
+                "        union { float f; unsigned int u; } conv;\n"
+                "        conv.f = f;\n"
+                "        return conv.u;\n"
+                "    }")
+        return self._preamble
     
     def init_python_value(self):
         """
@@ -365,7 +507,7 @@ class FloatType(BaseType):
         return u32.view(np.float32)
 
 
-class EnumType(BaseType):
+class EnumType(_BitSliceMixin, BaseType):
     """
     Enumeration type.
 
@@ -376,18 +518,30 @@ class EnumType(BaseType):
     enum_type : Type[Enum]
         Enum class type.
     width : int, optional
-        Bitwidth of the enum type. If None, calculated from number of entries.
+        Bitwidth of the enum type. If None, calculated from the largest entry value.
     """
+    __slots__ = ('name', 'enum_type', 'entries')
+
     def __init__(self, 
                  name: str, 
                  enum_type : Type[Enum], 
                  width: int = None):
         self.name = name
         self.enum_type = enum_type
-        self.entries = [(e.name, e.value) for e in enum_type]
+
+        # Collect the entries in one pass, tracking one past the largest value
+        entries = []
+        next_val = 0
+        for e in enum_type:
+            if type(e.value) is not int:
+                raise ValueError(f"Enum entry {e.name} must have an int value")
+            entries.append((e.name, e.value))
+            next_val = max(next_val, e.value + 1)
+        self.entries = entries
+
         if width is None:
-            import math
-            width = max(1, math.ceil(math.log2(len(self.entries))))
+            # Bits needed to hold values 0 .. next_val-1
+            width = max(1, (next_val - 1).bit_length())
         super().__init__(width)
     
     def cpp_repr(self) -> str:
@@ -397,48 +551,9 @@ class EnumType(BaseType):
         str
             C++ type string for this integer.
         """
-        return f"ap_uint<{self.width}>"
-
-    def read_expr_impl(self,
-                       word_name: str,
-                       word_width: int,
-                       ind0: int) -> str:
-        """
-        Generate C++ expression to read this integer from a word.
-
-        Returns
-        -------
-        str
-            C++ code snippet (expression only).
-        """
-        if self.width == word_width and ind0 == 0:
-            # Direct assignment if the field fills the whole word
-            return f"{word_name}"
-        else:
-            # Slice assignment
-            high = ind0 + self.width - 1
-            return f"{word_name}.range({high}, {ind0})"
-
-    def write_expr_impl(self,
-                        var_name: str,
-                        word_name: str,
-                        word_width: int,
-                        ind0: int) -> str:
-        """
-        Generate C++ expression to write this integer into a word.
-
-        Returns
-        -------
-        str
-            C++ code snippet (statement).
-        """
-        if self.width == word_width and ind0 == 0:
-            # Direct assignment if the field fills the whole word
-            return f"{word_name} = {var_name};"
-        else:
-            # Slice assignment
-            high = ind0 + self.width - 1
-            return f"{word_name}.range({high}, {ind0}) = {var_name};"
+        if self._cpp_repr is None:
+            self._cpp_repr = f"ap_uint<{self.width}>"
+        return self._cpp_repr
 
     def preamble(self) -> str:
         """
@@ -449,8 +564,10 @@ class EnumType(BaseType):
         str
             C++ enum declaration code snippet.
         """
-        enumerators = ",\n        ".join(f"{name} = {val}" for name, val in self.entries)
-        return f"enum {self.name} : unsigned int {{\n        {enumerators}\n    }};"  
+        if self._preamble is None:
+            enumerators = ",\n        ".join(f"{name} = {val}" for name, val in self.entries)
+            self._preamble = f"enum {self.name} : unsigned int {{\n        {enumerators}\n    }};"
+        return self._preamble
 
     def init_python_value(self):
         """
@@ -505,6 +622,8 @@ class EnumType(BaseType):
         return self.enum_type(val)
     
 class FieldInfo:
+    __slots__ = ('name', 'dtype', 'descr', 'comment_style')
+
     def __init__(
             self, 
             name: str, 
@@ -529,12 +648,13 @@ class FieldInfo:
         self.comment_style = comment_style
 
     def cpp_decl(self) -> str:
+        cpp_type = self.dtype.cpp_repr()
         if self.descr and self.comment_style == 'above':
-            return f"    // {self.descr}\n    {self.dtype.cpp_repr()} {self.name};"
+            return f"    // {self.descr}\n    {cpp_type} {self.name};"
         elif self.descr and self.comment_style == 'inline':
-            return f"    {self.dtype.cpp_repr()} {self.name}; // {self.descr}"
+            return f"    {cpp_type} {self.name}; // {self.descr}"
         else:
-            return f"    {self.dtype.cpp_repr()} {self.name};"
+            return f"    {cpp_type} {self.name};"
 
 class VitisStruct(object):
     def __init__(
@@ -662,12 +782,108 @@ class VitisCodeGen(object):
     ----------
     vs :  VitisStruct
         VitisStruct instance to generate code for.
+    pack_consecutive : bool, optional
+        If True (default), consecutive integer and enum fields in the same
+        stream word are written with a single bit-concatenated assignment
+        in stream_write.  Otherwise each field is written separately.
     """
+    __slots__ = ('name', 'fields', 'stream_bus_widths', 'pack_consecutive',
+                 '_layout_cache', '_max_field_width', '_fields_key')
+
     def __init__(self, 
-                 vs : VitisStruct):
+                 vs : VitisStruct,
+                 pack_consecutive : bool = True):
         self.name = vs.name
-        self.fields = vs.fields
+        self.fields = list(vs.fields)
         self.stream_bus_widths = []
+        self.pack_consecutive = pack_consecutive
+
+        # Cached field layouts, keyed on bus width, and the widest field,
+        # to validate bus widths without a pass over the fields.  Both are
+        # valid for the fields in _fields_key.
+        self._layout_cache = {}
+        self._max_field_width = 0
+        self._fields_key = None
+        self._sync_fields()
+
+    def add_field(self, field: FieldInfo):
+        """
+        Adds a field to the end of the struct.
+
+        Parameters
+        ----------
+        field : FieldInfo
+            Field to add.
+        """
+        self.fields.append(field)
+
+    def _sync_fields(self):
+        """
+        Clears the cached layouts and recomputes the widest field if the
+        fields have changed.  fields is a public list, so it may also be
+        modified directly rather than through add_field().
+        """
+        fields = tuple(self.fields)
+        if fields != self._fields_key:
+            self._fields_key = fields
+            self._layout_cache.clear()
+            self._max_field_width = max((f.dtype.width for f in fields), default=0)
+
+    def _check_bus_width(self, bus_width: int):
+        """
+        Raises ValueError if any field is wider than bus_width.
+        """
+        self._sync_fields()
+        if self._max_field_width > bus_width:
+            f = next(f for f in self.fields if f.dtype.width > bus_width)
+            raise ValueError(
+                f"Field '{f.name}' has width {f.dtype.width} bits, "
+                f"which exceeds bus width {bus_width} bits"
+            )
+
+    def _compute_layout(self, bus_width: int) -> tuple[list, int]:
+        """
+        Computes the placement of the fields in the bus words.
+
+        Fields are packed in order, starting a new word whenever a field
+        does not fit in the remaining bits of the current word.  The
+        result is cached until the fields are modified.
+
+        Parameters
+        ----------
+        bus_width : int
+            Bitwidth of the stream word.
+
+        Returns
+        -------
+        layout : list of (int, int, FieldInfo)
+            (word_idx, ind0, field) for each field, where word_idx is the
+            index of the bus word and ind0 is the starting bit in the word.
+        total_words : int
+            Number of bus words needed for the struct.
+        """
+        self._check_bus_width(bus_width)
+        if bus_width in self._layout_cache:
+            return self._layout_cache[bus_width]
+
+        layout = []
+        word_idx = -1  # index of the current word
+        ind0 = 0       # current bit index within the word
+        for f in self.fields:
+            bw = f.dtype.width
+
+            # If field doesn't fit in current word, start a new one
+            if ind0 + bw > bus_width or word_idx < 0:
+                word_idx += 1
+                ind0 = 0
+            layout.append((word_idx, ind0, f))
+
+            # Advance bit index
+            ind0 += bw
+
+        total_words = word_idx + 1
+        self._layout_cache[bus_width] = (layout, total_words)
+        return layout, total_words
 
     #def cpp_decl(self) -> str:
     #    decl_lines = [f"struct {self.name} {{"]
@@ -716,10 +932,9 @@ class VitisCodeGen(object):
         Returns
         -------
         str
-            Full path to the generated include file.
+            Full path to the generated include file.  If the file already
+            exists with the same content, it is not rewritten.
         """
-        import os
-        
         # Set defaults
         if include_dir is None:
             include_dir = os.getcwd()
@@ -727,150 +942,239 @@ class VitisCodeGen(object):
             include_file = f"{self.name.lower()}.h"
         if bus_widths is None:
             bus_widths = [32]
+
+        # Check the bus widths before generating anything
+        if bus_widths:
+            self._check_bus_width(min(bus_widths))
         
         # Store bus widths for dispatch method generation
         self.stream_bus_widths = bus_widths
         
         # Create include directory if it doesn't exist
         os.makedirs(include_dir, exist_ok=True)
-        
-        # Delete existing file if it exists
         file_path = os.path.join(include_dir, include_file)
-        if os.path.exists(file_path):
-            os.remove(file_path)
         
         # Generate include guard macro name
         guard_name = include_file.upper().replace('.', '_').replace('-', '_')
         
         # Build the file content
-        lines = []
-        
+        out = io.StringIO()
+
         # Include guard start
-        lines.append(f"#ifndef {guard_name}")
-        lines.append(f"#define {guard_name}")
-        lines.append("")
-        
+        out.write(f"#ifndef {guard_name}\n")
+        out.write(f"#define {guard_name}\n\n")
+
         # Include necessary headers
-        lines.append("#include <hls_stream.h>")
-        lines.append("#include <ap_int.h>")
-        lines.append("#include <ap_axi_sdata.h>")
-        lines.append("#include <string>")
-        lines.append("#include <sstream>")
-        lines.append("")
-        
+        out.write("#include <hls_stream.h>\n"
+                  "#include <ap_int.h>\n"
+                  "#include <ap_axi_sdata.h>\n"
+                  "#include <string>\n"
+                  "#include <sstream>\n"
+                  "#ifdef VITISSTRUCTS_USE_FMT\n"
+                  "#include <fmt/ostream.h>\n"
+                  "#endif\n\n")
+
         # Struct declaration with fields
-        lines.append(f"class {self.name} {{")
-        lines.append("public:")
-        lines.append("")
-        
-        # Add preambles for fields that have them
+        out.write(f"class {self.name} {{\n")
+        out.write("public:\n\n")
+
+        # Add preambles for fields that have them.  Fields of the same
+        # type share a preamble, so each one is written only once.
+        preambles = dict()
         for field in self.fields:
             preamble = field.dtype.preamble()
             if preamble is not None and preamble.strip():
-                lines.append(f"    {preamble}")
-                lines.append("")
-    
-        for field in self.fields:
-            lines.append(field.cpp_decl())
-        lines.append("")
-        
+                preambles[preamble] = None
+        for preamble in preambles:
+            out.write(f"    {preamble}\n\n")
+
+        out.write("".join([f"{field.cpp_decl()}\n" for field in self.fields]))
+        out.write("\n")
+
         # Generate stream functions for each bus width
         for bus_width in bus_widths:
-            # Generate stream_read
-            lines.append(self.gen_stream_read(bus_width))
-            lines.append("")
-            
-            # Generate stream_write
-            lines.append(self.gen_stream_write(bus_width))
-            lines.append("")
+            self.gen_stream_read(bus_width, out=out)
+            out.write("\n\n")
+            self.gen_stream_write(bus_width, out=out)
+            out.write("\n\n")
 
         # Generate generic dispatch methods
-        stream_write_dispatch, stream_read_dispatch = self.gen_stream_dispatch()
-        lines.append(stream_write_dispatch)
-        lines.append("")
-        lines.append(stream_read_dispatch)
-        lines.append("")
-        
+        self.gen_stream_dispatch(out=out)
+        out.write("\n\n")
+
         # Generate equality operator
-        lines.append(self.gen_equality_operator())
-        lines.append("")
-        
+        self.gen_equality_operator(out=out)
+        out.write("\n\n")
+
         # Generate to_string method
-        lines.append(self.gen_string_method())
-        lines.append("")
+        self.gen_string_method(out=out)
+        out.write("\n\n")
 
         # Close struct
-        lines.append("};")
-        lines.append("")
+        out.write("};\n\n")
 
         # Include guard end
-        lines.append(f"#endif // {guard_name}")
-        lines.append("")
+        out.write(f"#endif // {guard_name}\n")
 
-        # Write to file
-        with open(file_path, 'w') as f:
-            f.write("\n".join(lines))
+        # Encode once; the bytes are used for both the comparison and the write
+        content = out.getvalue().encode('utf-8')
+
+        # Leave the file untouched if its content is unchanged, so that build
+        # tools watching the header do not re-run synthesis
+        if os.path.exists(file_path):
+            with open(file_path, 'rb') as f:
+                if f.read() == content:
+                    return file_path
+
+        # Binary mode writes the '\n' line endings as is on every platform
+        with open(file_path, 'wb') as f:
+            f.write(content)
 
         return file_path
 
-    def gen_stream_read(self, bus_width: int = 32) -> str:
+    @staticmethod
+    def _to_str(gen, *args) -> str:
         """
-        Generate the C++ method for reading this struct from an HLS stream.
+        Runs a generator method that writes to a file-like object
+        and returns the generated code as a string.
+        """
+        buf = io.StringIO()
+        gen(*args, out=buf)
+        return buf.getvalue()
+
+    def _stream_context(self, bus_width: int) -> dict:
+        """
+        Build the template context for the stream_read / stream_write
+        methods from the field layout.
 
         Parameters
         ----------
-        bus_bits : int
+        bus_width : int
             Bitwidth of the stream word.
 
         Returns
         -------
-        str
-            C++ method definition as a string.
-        """
-        # Check that no field exceeds bus width
-        for f in self.fields:
-            if f.dtype.width > bus_width:
-                raise ValueError(
-                    f"Field '{f.name}' has width {f.dtype.width} bits, "
-                    f"which exceeds bus width {bus_width} bits"
-                )
-    
-        lines = []
-        lines.append("    template<typename Tstream>")
-        lines.append(f"    bool stream_read_{bus_width}(hls::stream<Tstream>& in) {{")
-        lines.append(f"        constexpr int bus_bits = decltype(Tstream::data)::width;")
-        lines.append(f"        static_assert(bus_bits == {bus_width}, "
-                    f"\"Only {bus_width}-bit stream supported in {self.name}::stream_read_{bus_width}\");")
-        lines.append("")
+        dict
+            Context with keys ``struct_name``, ``bus_width``, ``total_words``
+            and ``words``.
+            Each word is a dict with the word variable ``var``, the list
+            of ``fields`` packed into the word, the ``write_stmts`` for
+            stream_write and the ``is_last`` flag.
+        """
+        layout, total_words = self._compute_layout(bus_width)
+        words = [{
+            'var': f"w{i}",
+            'fields': [],
+            'is_last': i == total_words - 1} for i in range(total_words)]
+
+        # Compute the read and write expressions for each field.
+        # stream_read buffers the words in an array _words[], named so it
+        # cannot hide a field, while stream_write uses one variable per word.
+        for word_idx, ind0, f in layout:
+            words[word_idx]['fields'].append({
+                'name': f.name,
+                'expr': f.dtype.read_expr(f"_words[{word_idx}].data", bus_width, ind0),
+                'write_stmt': f.dtype.write_expr(f.name, f"w{word_idx}.data", bus_width, ind0),
+                'ind0': ind0,
+                'width': f.dtype.width,
+                'packable': isinstance(f.dtype, _BitSliceMixin)})
+
+        # Statements to write each word
+        for word in words:
+            word['write_stmts'] = self._write_stmts(word, bus_width)
+
+        return {
+            'struct_name': self.name,
+            'bus_width': bus_width,
+            'total_words': total_words,
+            'words': words}
+
+    def _write_stmts(self, word: dict, bus_width: int) -> list[str]:
+        """
+        Returns the statements writing the fields of one word in stream_write.
+
+        If pack_consecutive is set, each run of two or more consecutive integer
+        or enum fields is written with one assignment using the ap_int
+        concatenation operator, e.g. ``w0.data.range(47, 0) = (a, trans_id);``.
+        Float fields need a bit conversion and are always written separately.
 
-        ind0 = 0       # current bit index within the word
-        word_count = 0 # count of words read
-        word_var = None
-
-        for f in self.fields:
-            bw = f.dtype.width
-
-            # If field doesn't fit in current word, read a new one
-            if ind0 + bw > bus_width or word_var is None:
-                word_var = f"w{word_count}"
-                lines.append(f"        Tstream {word_var} = in.read();")
-                ind0 = 0
-                word_count += 1
+        Parameters
+        ----------
+        word : dict
+            Word entry from the stream context.
+        bus_width : int
+            Bitwidth of the stream word.
 
-            # Generate assignment using field's read_expr
-            expr = f.dtype.read_expr(word_var + ".data", bus_width, ind0)
-            lines.append(f"        {f.name} = {expr};")
+        Returns
+        -------
+        list[str]
+            C++ statements.
+        """
+        fields = word['fields']
+        if not self.pack_consecutive:
+            return [f['write_stmt'] for f in fields]
+
+        word_data = f"{word['var']}.data"
+        stmts = []
+        i = 0
+        while i < len(fields):
+            # Find the run of packable fields starting at i
+            j = i
+            while j < len(fields) and fields[j]['packable']:
+                j += 1
+            if j - i < 2:
+                stmts.append(fields[i]['write_stmt'])
+                i += 1
+                continue
+
+            # Concatenate the run, most significant field first
+            low = fields[i]['ind0']
+            high = fields[j - 1]['ind0'] + fields[j - 1]['width'] - 1
+            names = ", ".join(f['name'] for f in reversed(fields[i:j]))
+            if low == 0 and high == bus_width - 1:
+                stmts.append(f"{word_data} = ({names});")
+            else:
+                stmts.append(f"{_range(word_data, high, low)} = ({names});")
+            i = j
+        return stmts
 
-            # Advance bit index
-            ind0 += bw
+    def gen_stream_read(
+            self,
+            bus_width: int = 32,
+            out: TextIO | None = None) -> str | None:
+        """
+        Generate the C++ method for reading this struct from an HLS stream.
 
-        lines.append(f"        bool tlast = {word_var}.last;")
-        lines.append("")
-        lines.append("        return tlast;")
-        lines.append("    }")
-        return "\n".join(lines)
+        Parameters
+        ----------
+        bus_bits : int
+            Bitwidth of the stream word.
+        out : TextIO | None
+            File-like object to write the code to.  If None, the code
+            is returned as a string.
 
-    def gen_stream_write(self, bus_width: int = 32) -> str:
+        Returns
+        -------
+        str | None
+            C++ method definition as a string if out is None.
+        """
+        if out is None:
+            return self._to_str(self.gen_stream_read, bus_width)
+        ctx = self._stream_context(bus_width)
+        field_stmts = "".join(
+            f"        {f['name']} = {f['expr']};\n"
+            for word in ctx['words'] for f in word['fields'])
+        out.write(STREAM_READ_TMPL.format_map({
+            'struct_name': ctx['struct_name'],
+            'bus_width': bus_width,
+            'total_words': ctx['total_words'],
+            'last_word': ctx['total_words'] - 1,
+            'field_stmts': field_stmts}))
+
+    def gen_stream_write(
+            self,
+            bus_width: int = 32,
+            out: TextIO | None = None) -> str | None:
         """
         Generate the C++ method for writing this struct to an HLS stream.
 
@@ -878,188 +1182,138 @@ class VitisCodeGen(object):
         ----------
         bus_width : int
             Bitwidth of the stream word.
+        out : TextIO | None
+            File-like object to write the code to.  If None, the code
+            is returned as a string.
 
         Returns
         -------
-        str
-            C++ method definition as a string.
+        str | None
+            C++ method definition as a string if out is None.
+        """
+        if out is None:
+            return self._to_str(self.gen_stream_write, bus_width)
+        ctx = self._stream_context(bus_width)
+        word_blocks = "\n".join(
+            STREAM_WRITE_WORD_TMPL.format_map({
+                'var': word['var'],
+                'write_stmts': "".join(f"        {stmt}\n" for stmt in word['write_stmts']),
+                'last': 'tlast' if word['is_last'] else 'false'})
+            for word in ctx['words'])
+        out.write(STREAM_WRITE_TMPL.format_map({
+            'struct_name': ctx['struct_name'],
+            'bus_width': bus_width,
+            'word_blocks': word_blocks}))
+
+    def gen_stream_dispatch(
+            self,
+            out: TextIO | None = None) -> tuple[str, str] | None:
         """
-        # Check that no field exceeds bus width
-        for f in self.fields:
-            if f.dtype.width > bus_width:
-                raise ValueError(
-                    f"Field '{f.name}' has width {f.dtype.width} bits, "
-                    f"which exceeds bus width {bus_width} bits"
-                )
-    
-        lines = []
-        lines.append("    template<typename Tstream>")
-        lines.append(f"    void stream_write_{bus_width}(hls::stream<Tstream>& out, bool tlast = true) const {{")
-        lines.append(f"        constexpr int bus_bits = decltype(Tstream::data)::width;")
-        lines.append(f"        static_assert(bus_bits == {bus_width}, "
-                    f"\"Only {bus_width}-bit stream supported in {self.name}::stream_write_{bus_width}\");")
-        lines.append("")
-
-        ind0 = 0       # current bit index within the word
-        word_count = 0 # count of words written
-        word_var = None
-        total_words = 0  # track total number of words needed
-
-        # First pass: determine total number of words needed
-        temp_ind = 0
-        temp_count = 0
-        for f in self.fields:
-            bw = f.dtype.width
-            if temp_ind + bw > bus_width or temp_count == 0:
-                temp_count += 1
-                temp_ind = bw
-            else:
-                temp_ind += bw
-        total_words = temp_count
-
-        # Second pass: generate the write code
-        for f in self.fields:
-            bw = f.dtype.width
-
-            # If field doesn't fit in current word, write current word and start a new one
-            if ind0 + bw > bus_width or word_var is None:
-                # Write the previous word if it exists
-                if word_var is not None:
-                    is_last = word_count == total_words
-                    lines.append(f"        {word_var}.last = false;")
-                    lines.append(f"        out.write({word_var});")
-                    lines.append("")
-                
-                # Start a new word
-                word_count += 1
-                word_var = f"w{word_count - 1}"
-                lines.append(f"        Tstream {word_var};")
-                lines.append(f"        {word_var}.data = 0;")
-                lines.append(f"        {word_var}.keep = -1;")
-                lines.append(f"        {word_var}.strb = -1;")
-                ind0 = 0
-
-            # Generate write expression using field's write_expr
-            write_stmt = f.dtype.write_expr(f.name, word_var + ".data", bus_width, ind0)
-            lines.append(f"        {write_stmt}")
-
-            # Advance bit index
-            ind0 += bw
-
-        # Write the final word
-        if word_var is not None:
-            lines.append(f"        {word_var}.last = tlast;")
-            lines.append(f"        out.write({word_var});")
+        Generate generic stream_read and stream_write dispatch methods.
 
-        lines.append("    }")
-        return "\n".join(lines)
+        The dispatch is resolved at compile time by a _stream_rw<W, Self>
+        selector with one partial specialization per bus width in
+        stream_bus_widths.  The selector is emitted ahead of stream_write.
 
-    def gen_stream_dispatch(self) -> tuple[str, str]:
-        """
-        Generate generic stream_read and stream_write dispatch methods.
+        Parameters
+        ----------
+        out : TextIO | None
+            File-like object to write the code to, with the stream_write
+            method first.  If None, the code is returned as strings.
         
         Returns
         -------
-        tuple[str, str]
-            (stream_write code, stream_read code)
+        tuple[str, str] | None
+            (stream_write code, stream_read code) if out is None.
         """
         
         if not self.stream_bus_widths:
             # If no bus widths are defined, generate methods that always fail at compile time
-            write_lines = []
-            write_lines.append("    template<typename Tstream>")
-            write_lines.append("    void stream_write(hls::stream<Tstream>& out, bool tlast = true) const {")
-            write_lines.append("        static_assert(sizeof(Tstream) == 0, ")
-            write_lines.append(f"                     \"No stream bus widths configured for {self.name}\");")
-            write_lines.append("    }")
-            
-            read_lines = []
-            read_lines.append("    template<typename Tstream>")
-            read_lines.append("    bool stream_read(hls::stream<Tstream>& in) {")
-            read_lines.append("        static_assert(sizeof(Tstream) == 0, ")
-            read_lines.append(f"                     \"No stream bus widths configured for {self.name}\");")
-            read_lines.append("        return false;")
-            read_lines.append("    }")
-            
-            return "\n".join(write_lines), "\n".join(read_lines)
-
-        # Generate stream_write dispatch
-        write_lines = []
-        write_lines.append("    template<typename Tstream>")
-        write_lines.append("    void stream_write(hls::stream<Tstream>& out, bool tlast = true) const {")
-        write_lines.append("        constexpr int bus_bits = decltype(Tstream::data)::width;")
-        
-        for i, width in enumerate(self.stream_bus_widths):
-            if i == 0:
-                write_lines.append(f"        if constexpr (bus_bits == {width}) {{")
-            else:
-                write_lines.append(f"        }} else if constexpr (bus_bits == {width}) {{")
-            write_lines.append(f"            stream_write_{width}(out, tlast);")
-        
-        write_lines.append("        } else {")
-        widths_str = ", ".join(str(w) for w in self.stream_bus_widths)
-        write_lines.append(f"            static_assert(bus_bits == {self.stream_bus_widths[0]}, ")
-        write_lines.append(f"                         \"Unsupported bus width. Supported widths: {widths_str}\");")
-        write_lines.append("        }")
-        write_lines.append("    }")
-        
-        # Generate stream_read dispatch
-        read_lines = []
-        read_lines.append("    template<typename Tstream>")
-        read_lines.append("    bool stream_read(hls::stream<Tstream>& in) {")
-        read_lines.append("        constexpr int bus_bits = decltype(Tstream::data)::width;")
-        
-        for i, width in enumerate(self.stream_bus_widths):
-            if i == 0:
-                read_lines.append(f"        if constexpr (bus_bits == {width}) {{")
-            else:
-                read_lines.append(f"        }} else if constexpr (bus_bits == {width}) {{")
-            read_lines.append(f"            return stream_read_{width}(in);")
-        
-        read_lines.append("        } else {")
-        read_lines.append(f"            static_assert(bus_bits == {self.stream_bus_widths[0]}, ")
-        read_lines.append(f"                         \"Unsupported bus width. Supported widths: {widths_str}\");")
-        read_lines.append("            return false;")
-        read_lines.append("        }")
-        read_lines.append("    }")
-        
-        return "\n".join(write_lines), "\n".join(read_lines)
+            write_code = DISPATCH_NONE_WRITE_TMPL.format_map({'name': self.name})
+            read_code = DISPATCH_NONE_READ_TMPL.format_map({'name': self.name})
+        else:
+            # The selector has one partial specialization per bus width
+            ctx = {
+                'name': self.name,
+                'widths_str': ", ".join(str(w) for w in self.stream_bus_widths),
+                'specializations': "".join(
+                    DISPATCH_SPEC_TMPL.format_map({'width': w}) for w in self.stream_bus_widths)}
+            write_code = DISPATCH_WRITE_TMPL.format_map(ctx)
+            read_code = DISPATCH_READ_TMPL.format_map(ctx)
+
+        if out is None:
+            return write_code, read_code
+        out.write(f"{write_code}\n\n{read_code}")
     
-    def gen_equality_operator(self) -> str:
+    def gen_equality_operator(
+            self,
+            out: TextIO | None = None) -> str | None:
         """
         Generate C++ equality operator for this struct.
 
+        Parameters
+        ----------
+        out : TextIO | None
+            File-like object to write the code to.  If None, the code
+            is returned as a string.
+
         Returns
         -------
-        str
-            C++ method definition as a string.
-        """
-        lines = []
-        lines.append(f"    bool operator==(const {self.name}& other) const {{")
-        comparisons = [f"(this->{f.name} == other.{f.name})" for f in self.fields]
-        lines.append("        return " + " && ".join(comparisons) + ";")
-        lines.append("    }")
-        return "\n".join(lines)
+        str | None
+            C++ method definition as a string if out is None.
+        """
+        if out is None:
+            return self._to_str(self.gen_equality_operator)
+        out.write(f"    bool operator==(const {self.name}& other) const {{\n")
+        comparisons = " && ".join(f"(this->{f.name} == other.{f.name})" for f in self.fields)
+        out.write(f"        return {comparisons};\n")
+        out.write("    }")
     
-    def gen_string_method(self) -> str:
+    def gen_string_method(
+            self,
+            out: TextIO | None = None) -> str | None:
         """
         Generate C++ method to convert this struct to a string.
 
+        The string is built with a std::ostringstream by default.  Builds
+        that define VITISSTRUCTS_USE_FMT and have fmtlib 9.0 or later use a
+        single fmt::format call instead; they must also link fmtlib or
+        define FMT_HEADER_ONLY.
+
+        Parameters
+        ----------
+        out : TextIO | None
+            File-like object to write the code to.  If None, the code
+            is returned as a string.
+
         Returns
         -------
-        str
-            C++ method definition as a string.
-        """
-        lines = []
-        lines.append("    std::string to_string() const {")
-        lines.append("        std::ostringstream oss;")
-        lines.append('        oss << "{";')
-        for i, f in enumerate(self.fields):
-            if i < len(self.fields) - 1:
-                lines.append(f'        oss << "{f.name}: " << {f.name} << ", ";')
-            else:
-                lines.append(f'        oss << "{f.name}: " << {f.name};')
-        lines.append('        oss << "}";')
-        lines.append("        return oss.str();")
-        lines.append("    }")
-        return "\n".join(lines)
\ No newline at end of file
+        str | None
+            C++ method definition as a string if out is None.
+        """
+        if out is None:
+            return self._to_str(self.gen_string_method)
+        out.write("    std::string to_string() const {\n")
+
+        # fmtlib version.  The ap_int types only define operator<<, so the
+        # fields are passed through fmt::streamed, which needs fmt 9.0.
+        fmt_str = "{{" + ", ".join(f"{f.name}: {{}}" for f in self.fields) + "}}"
+        out.write("#if defined(VITISSTRUCTS_USE_FMT) && defined(FMT_VERSION) && FMT_VERSION >= 90000\n")
+        out.write(f'        return fmt::format("{fmt_str}"')
+        for f in self.fields:
+            out.write(f",\n                           fmt::streamed({f.name})")
+        out.write(");\n")
+
+        # ostringstream fallback
+        out.write("#else\n")
+        out.write("        std::ostringstream oss;\n")
+        out.write('        oss << "{";\n')
+        if self.fields:
+            for f in self.fields[:-1]:
+                out.write(f'        oss << "{f.name}: " << {f.name} << ", ";\n')
+            f = self.fields[-1]
+            out.write(f'        oss << "{f.name}: " << {f.name};\n')
+        out.write('        oss << "}";\n')
+        out.write("        return oss.str();\n")
+        out.write("#endif\n")
+        out.write("    }")